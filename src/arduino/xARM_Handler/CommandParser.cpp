@@ -56,6 +56,12 @@ void processSerialCommands() {
     int pos = scanBlockRow();
     snprintf(response, sizeof(response), "scan_row %d", pos);
 
+  // PING <TOKEN> (liveness probe; echoes the token and leaves the display alone)
+  } else if (cmd.startsWith("ping")) {
+    Serial.print("pong ");
+    Serial.println(cmd.substring(5));
+    return;
+
   } else {
     snprintf(response, sizeof(response), "command unknown : %s", cmd);
   }
@@ -1,21 +1,55 @@
 import serial
 import asyncio
 import json
+import secrets
 import time
 from helper import SERIAL_PORT, BAUD_RATE, CONNECTION_STRING
-from azure.iot.device.aio import IoTHubDeviceClient
-from azure.iot.device import Message, MethodResponse
 from twin_manager import TwinManager
 
+# The Azure IoT SDK (and its MQTT stack) is imported lazily in
+# connect_iot_hub() so it loads in a worker thread while the serial port
+# is being opened instead of delaying the start of the process.
+
 ser = None  # Global variable for serial connection
 
+# Firmware probe: the sketch answers "ping <token>" with "pong <token>"
+# without touching the OLED, so a reply proves the sketch is up and parsing,
+# and the token tells us which probe was answered.
+FIRMWARE_PROBE = "ping"
+FIRMWARE_PROBE_INTERVAL = 0.5   # seconds of line silence before re-probing
+FIRMWARE_CHECK_TIMEOUT = 5      # seconds per firmware check attempt
+FIRMWARE_DRAIN_QUIET = 1.0      # seconds of silence (> sketch init + one display refresh) that ends a drain
+FIRMWARE_CHECK_ATTEMPTS = 3     # attempts made while holding the serial lock at startup
+FIRMWARE_RETRY_INTERVAL = 10    # seconds between background retries after startup fails
+HUB_CONNECT_MAX_DELAY = 30      # cap for the IoT Hub connect backoff
+
+async def open_serial() -> serial.Serial:
+    """
+    Makes a single attempt to open the serial port, if it isn't open already.
+
+    Opens the port in a worker thread so the event loop stays responsive.
+
+    Returns:
+        serial.Serial: An open serial connection object.
+
+    Raises:
+        serial.SerialException: If the port cannot be opened.
+    """
+    global ser
+    if ser is None or not ser.is_open:
+        print(f"🔄 Attempting to connect to serial port {SERIAL_PORT}...")
+        ser = await asyncio.to_thread(serial.Serial, SERIAL_PORT, BAUD_RATE, timeout=2)
+        print(f"🔗 Serial connected on {SERIAL_PORT}")
+    return ser
+
+
 async def get_serial() -> serial.Serial:
     """
     Asynchronously attempts to establish a serial connection with the specified port using exponential backoff.
 
     This function repeatedly tries to connect to a serial port defined by the global variable `SERIAL_PORT` 
     with the baud rate specified by `BAUD_RATE`. If the connection fails, it waits for an exponentially 
-    increasing delay (starting at 2 seconds, up to a maximum of 30 seconds) before retrying. The process 
+    increasing delay (starting at 0.5 seconds, up to a maximum of 30 seconds) before retrying. The process 
     continues until a successful connection is made (i.e., `ser` is not None and is open).
 
     Returns:
@@ -32,19 +66,197 @@ async def get_serial() -> serial.Serial:
     Note:
         This function is designed to be used in an asynchronous context (i.e., must be awaited).
     """
-    global ser
-    delay = 2
-    while ser is None or not ser.is_open:
+    delay = 0.5
+    while True:
         try:
-            print(f"🔄 Attempting to connect to serial port {SERIAL_PORT}...")
-            ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=2)
-            print(f"🔗 Serial connected on {SERIAL_PORT}")
+            return await open_serial()
         except serial.SerialException as e:
             print(f"❌ Serial connection failed: {e}")
             print(f"⏳ Retrying in {delay} seconds...")
             await asyncio.sleep(delay)
             delay = min(delay * 2, 30)  # exponential backoff up to 30s
-    return ser
+
+
+async def check_firmware(ser_conn: serial.Serial, timeout: float = FIRMWARE_CHECK_TIMEOUT) -> str:
+    """
+    Probes the Arduino until the firmware answers with the latest probe token.
+
+    Opening the port resets the board, so early probes are usually lost to
+    the bootloader, while probes sent during sensor/display init sit in the
+    Arduino's RX buffer and are answered later, one loop apart. Every probe
+    carries a fresh token and only the `pong` echoing the most recent token
+    is accepted; the firmware answers in order, so once it arrives no older
+    probe replies are still in flight. Any other line (older pongs, init
+    messages such as "APDS9960 not found") is skipped. A new probe is only
+    sent after the line has been silent for `FIRMWARE_PROBE_INTERVAL`.
+
+    On timeout, probes may still be queued on the board; callers must drain
+    the line with `drain_serial()` before handing the port to other users.
+
+    Args:
+        ser_conn: An open serial connection to the Arduino.
+        timeout: Maximum number of seconds to wait for a reply.
+
+    Returns:
+        str: The firmware's reply, or an empty string if it never answered.
+
+    Raises:
+        serial.SerialException, OSError: If the port fails during the probe.
+    """
+    deadline = time.monotonic() + timeout
+    expected = ""
+    next_probe = time.monotonic()
+    while time.monotonic() < deadline:
+        if time.monotonic() >= next_probe:
+            token = secrets.token_hex(3)
+            expected = f"pong {token}"
+            ser_conn.write(f"{FIRMWARE_PROBE} {token}\n".encode())
+            next_probe = time.monotonic() + FIRMWARE_PROBE_INTERVAL
+
+        if ser_conn.in_waiting:
+            line = ser_conn.readline().decode('utf-8', errors='replace').strip()
+            if line == expected:
+                return line
+            if line:
+                print(f"🔎 Skipping serial line during firmware check: {line}")
+            next_probe = time.monotonic() + FIRMWARE_PROBE_INTERVAL
+            continue
+
+        await asyncio.sleep(0.01)
+    return ""
+
+
+async def drain_serial(ser_conn: serial.Serial, quiet: float = FIRMWARE_DRAIN_QUIET,
+                       timeout: float = FIRMWARE_CHECK_TIMEOUT) -> None:
+    """
+    Discards incoming serial data until the line has been silent for `quiet` seconds.
+
+    Used after a firmware check so late probe replies are not read as telemetry
+    or as the response to the next command. Gives up after `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    quiet_until = time.monotonic() + quiet
+    while time.monotonic() < min(quiet_until, deadline):
+        if ser_conn.in_waiting:
+            ser_conn.reset_input_buffer()
+            quiet_until = time.monotonic() + quiet
+        await asyncio.sleep(0.01)
+    ser_conn.reset_input_buffer()
+
+
+async def bring_up_serial(serial_lock, timings: dict, attempts: int = FIRMWARE_CHECK_ATTEMPTS) -> bool:
+    """
+    Opens the serial port and waits for the Arduino firmware to respond.
+
+    Holds `serial_lock` for at most `attempts` attempts so telemetry, C2D and
+    direct method handlers queue behind it instead of talking to a board that
+    is still booting, without being blocked forever by a missing port or a
+    board that never answers. Each attempt makes one try at opening the port
+    (with backoff between failed opens) and one firmware check. Serial errors
+    close the port and move on to the next attempt, like every other serial
+    user in this module. The line is drained before the lock is released.
+
+    `serial_open` and `firmware_check` are only recorded the first time, so
+    background retries don't overwrite the startup figures.
+
+    Args:
+        serial_lock: An asyncio-compatible lock guarding the serial connection.
+        timings: Dict that receives `serial_open` and `firmware_check` in milliseconds.
+        attempts: Number of attempts to make before giving up.
+
+    Returns:
+        bool: True if the firmware answered, False otherwise.
+    """
+    global ser
+    delay = 0.5
+    firmware_start = None
+    async with serial_lock:
+        for attempt in range(1, attempts + 1):
+            try:
+                start = time.perf_counter()
+                ser_conn = await open_serial()
+                timings.setdefault("serial_open", _elapsed_ms(start))
+            except serial.SerialException as e:
+                print(f"❌ Serial connection failed: {e} (attempt {attempt}/{attempts})")
+                if attempt < attempts:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+                continue
+
+            try:
+                if firmware_start is None:
+                    firmware_start = time.perf_counter()
+                reply = await check_firmware(ser_conn)
+                if reply:
+                    timings.setdefault("firmware_check", _elapsed_ms(firmware_start))
+                    print(f"🤖 Firmware responded: {reply}")
+                    # Older probes were answered before this one; drop anything else buffered
+                    ser_conn.reset_input_buffer()
+                    return True
+                print(f"⚠️ No firmware response within {FIRMWARE_CHECK_TIMEOUT}s (attempt {attempt}/{attempts})")
+                await drain_serial(ser_conn)
+            except Exception as e:
+                print(f"⚠️ Serial bring-up error: {e}")
+                if ser: ser.close()
+                ser = None
+
+        if firmware_start is not None:
+            timings.setdefault("firmware_check", _elapsed_ms(firmware_start))
+    return False
+
+
+def _load_iot_sdk():
+    """Imports the Azure IoT device client class (heavy: pulls in paho-mqtt)."""
+    from azure.iot.device.aio import IoTHubDeviceClient
+    return IoTHubDeviceClient
+
+
+async def connect_iot_hub(timings: dict):
+    """
+    Imports the Azure IoT SDK and connects the device client to IoT Hub.
+
+    The SDK import runs in a worker thread so it overlaps with serial bring-up.
+    Transient connection failures (e.g. the network is not up yet after a
+    power cycle) are retried with exponential backoff, starting at 0.5
+    seconds, up to `HUB_CONNECT_MAX_DELAY` seconds. Permanent failures such
+    as bad credentials (`CredentialError`, `ClientError`) are raised.
+
+    Args:
+        timings: Dict that receives `sdk_import` and `hub_connect` in milliseconds.
+
+    Returns:
+        IoTHubDeviceClient: A connected device client.
+    """
+    start = time.perf_counter()
+    IoTHubDeviceClient = await asyncio.to_thread(_load_iot_sdk)
+    timings["sdk_import"] = _elapsed_ms(start)
+    from azure.iot.device.exceptions import (  # already loaded with the client
+        ConnectionDroppedError,
+        ConnectionFailedError,
+        OperationTimeout,
+    )
+
+    start = time.perf_counter()
+    device_client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
+    delay = 0.5
+    while True:
+        try:
+            print("🔌 Connecting to Azure IoT Hub...")
+            await device_client.connect()
+            break
+        except (ConnectionFailedError, ConnectionDroppedError, OperationTimeout) as e:
+            print(f"❌ IoT Hub connection failed: {e}")
+            print(f"⏳ Retrying in {delay} seconds...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, HUB_CONNECT_MAX_DELAY)
+    timings["hub_connect"] = _elapsed_ms(start)
+    print("✅ Connected to Azure IoT Hub")
+    return device_client
+
+
+def _elapsed_ms(start: float) -> int:
+    """Milliseconds elapsed since a `time.perf_counter()` reading."""
+    return round((time.perf_counter() - start) * 1000)
 
 # Function to send telemetry data from Arduino to Azure IoT Hub
 async def send_telemetry(client, serial_lock):
@@ -135,6 +347,8 @@ async def handle_methods(client, serial_lock, twin_manager: TwinManager):
     Returns:
         None. The function runs indefinitely, processing incoming method requests.
     """
+    from azure.iot.device import MethodResponse  # already loaded by connect_iot_hub()
+
     while True:
         method_request = await client.receive_method_request()
         method_name = method_request.name
@@ -193,24 +407,70 @@ async def handle_methods(client, serial_lock, twin_manager: TwinManager):
         await client.send_method_response(method_response)
 
 
+async def mark_ready(serial_task, serial_lock, ready, timings: dict, startup_start: float, twin_manager: TwinManager):
+    """
+    Waits for serial bring-up to finish, then signals readiness.
+
+    Sets the `ready` event (which releases the first sensor poll), prints the
+    startup-phase timing breakdown and reports it on the device twin so
+    readiness is visible from the cloud. If the firmware did not answer at
+    startup, reports `firmware_ok: false` with the serial lock released so
+    handlers run and surface their own timeouts, and keeps retrying the
+    firmware check in the background until it succeeds; the time spent there
+    is reported as the `firmware_retry` phase.
+    """
+    firmware_ok = await serial_task
+    if not firmware_ok:
+        retry_start = time.perf_counter()
+        print(f"⚠️ Firmware not responding; retrying every {FIRMWARE_RETRY_INTERVAL}s in the background")
+        twin_manager.set_startup_report(timings, firmware_ok=False)
+        await twin_manager.push_twin_update()
+        while not firmware_ok:
+            await asyncio.sleep(FIRMWARE_RETRY_INTERVAL)
+            firmware_ok = await bring_up_serial(serial_lock, timings, attempts=1)
+        timings["firmware_retry"] = _elapsed_ms(retry_start)
+
+    timings["total"] = _elapsed_ms(startup_start)
+    ready.set()
+
+    breakdown = ", ".join(f"{phase}={ms}ms" for phase, ms in timings.items())
+    print(f"🚀 Gateway ready: {breakdown}")
+
+    twin_manager.set_startup_report(timings, firmware_ok=True)
+    await twin_manager.push_twin_update()
+
+
 async def main():
     """
     Main entry point for the application.
-    Initializes the Azure IoT Hub device client, digital twin manager,
-    and launches all concurrent tasks: telemetry, C2D messages, direct methods,
-    and periodic sensor polling.
+    Opens the serial port, checks the Arduino firmware and connects to Azure
+    IoT Hub concurrently, then launches all handlers: telemetry, C2D messages,
+    direct methods and periodic sensor polling. Handlers start as soon as the
+    hub is connected and queue on the serial lock until the firmware answers
+    (or bring-up gives up and keeps retrying in the background).
     """
-    # Create IoT Hub device client
-    device_client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
-    print("🔌 Connecting to Azure IoT Hub...")
-    await device_client.connect()
-    print("✅ Connected! Listening & sending telemetry...")
+    startup_start = time.perf_counter()
+    timings: dict[str, int] = {}
 
-    # Create serial lock in the correct event loop context
+    # Create serial lock and readiness event in the correct event loop context
     serial_lock = asyncio.Lock()
+    ready = asyncio.Event()
+
+    # Serial bring-up takes the lock first, then overlaps with the hub connection
+    serial_task = asyncio.create_task(bring_up_serial(serial_lock, timings))
+    try:
+        device_client = await connect_iot_hub(timings)
+    except BaseException:
+        # Don't leave bring-up running (and holding the lock) behind a failed start
+        serial_task.cancel()
+        try:
+            await serial_task
+        except asyncio.CancelledError:
+            pass
+        raise
 
     # Create twin manager
-    twin_mgr = TwinManager(device_client, serial_lock, get_serial)
+    twin_mgr = TwinManager(device_client, serial_lock, get_serial, ready)
 
     # Register desired properties handler (allows cloud to adjust poll interval)
     device_client.on_twin_desired_properties_patch_received = twin_mgr.handle_desired_properties
@@ -221,6 +481,7 @@ async def main():
         receive_c2d_messages(device_client, serial_lock),
         handle_methods(device_client, serial_lock, twin_mgr),
         twin_mgr.run_periodic_poll(),
+        mark_ready(serial_task, serial_lock, ready, timings, startup_start, twin_mgr),
     )
 
 if __name__ == "__main__":
@@ -18,11 +18,13 @@ DEFAULT_POLL_INTERVAL = 30
 class TwinManager:
     """Manages the robot's digital twin reported properties."""
 
-    def __init__(self, device_client, serial_lock, get_serial_fn):
+    def __init__(self, device_client, serial_lock, get_serial_fn, ready_event: asyncio.Event):
         self._client = device_client
         self._serial_lock = serial_lock
         self._get_serial = get_serial_fn
+        self._ready = ready_event
         self._poll_interval = DEFAULT_POLL_INTERVAL
+        self._startup: dict[str, Any] = {"firmware_ok": None, "phases_ms": {}}
 
         # Internal state
         self._grid: dict[str, dict[str, Any]] = {}
@@ -177,6 +179,10 @@ class TwinManager:
         """Set arm state: 'idle' or 'busy'."""
         self._arm_state = state
 
+    def set_startup_report(self, phases_ms: dict[str, int], firmware_ok: bool) -> None:
+        """Record the startup outcome, with per-phase durations in ms."""
+        self._startup = {"firmware_ok": firmware_ok, "phases_ms": dict(phases_ms)}
+
     # ------------------------------------------------------------------
     # Twin reporting
     # ------------------------------------------------------------------
@@ -190,6 +196,7 @@ class TwinManager:
             "last_command": self._last_command,
             "last_sensor_poll": None,  # updated by poll_sensors
             "poll_interval_seconds": self._poll_interval,
+            "startup": {"ready": self._ready.is_set(), **self._startup},
         }
 
     async def push_twin_update(self) -> None:
@@ -250,8 +257,8 @@ class TwinManager:
 
     async def run_periodic_poll(self) -> None:
         """Run sensor polling on a loop. Respects poll_interval from desired properties."""
-        # Wait a few seconds on startup for serial to be ready
-        await asyncio.sleep(5)
+        # Wait until serial and firmware are up
+        await self._ready.wait()
 
         while True:
             # Only poll when arm is idle